@@ -8,57 +8,116 @@ Usage:
 """
 
 import argparse
+import io
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
 import fitz  # PyMuPDF
 
 
-def extract_text_with_reading_order(pdf_path: str) -> str:
+# Below this many pages, starting worker processes costs more than it saves
+PARALLEL_MIN_PAGES = 8
+
+
+@lru_cache(maxsize=32)
+def _open_document(pdf_path: str, mtime: float) -> fitz.Document:
     """
-    Extract text from PDF with approximate reading order and table preservation.
+    Open a PDF once per process and reuse it. Keyed on mtime so a changed file is reopened;
+    documents are closed when they fall out of the cache.
+    """
+    return fitz.open(pdf_path)
+
+
+def _extract_page(pdf_path: str, page_num: int) -> tuple:
+    """
+    Extract one page's text lines in reading order. Returns (page_num, text).
     """
-    doc = fitz.open(pdf_path)
-    text_parts = []
+    doc = _open_document(pdf_path, os.path.getmtime(pdf_path))
+    page = doc[page_num]
+    out = io.StringIO()
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # Get text blocks with position information
-        blocks = page.get_text("dict")
-        
-        # Sort blocks by y-coordinate (top to bottom), then x-coordinate (left to right)
-        text_blocks = []
-        for block in blocks["blocks"]:
-            if "lines" in block:  # Text block
-                for line in block["lines"]:
-                    line_text = ""
-                    for span in line["spans"]:
-                        line_text += span["text"]
-                    if line_text.strip():
-                        text_blocks.append({
-                            "text": line_text,
-                            "bbox": line["bbox"]  # [x0, y0, x1, y1]
-                        })
-        
-        # Sort by y-coordinate (top to bottom), then x-coordinate (left to right)
-        text_blocks.sort(key=lambda b: (b["bbox"][1], b["bbox"][0]))
+    # TEXTFLAGS_BLOCKS is what get_text("blocks") uses; it leaves out images
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_BLOCKS)
+    
+    # Line text comes from the blocks, which keep the original spacing inside a line;
+    # words would collapse table-like runs of spaces
+    block_lines = {block_no: block_text.split("\n")
+                   for _, _, _, _, block_text, block_no, block_type in textpage.extractBLOCKS()
+                   if block_type == 0}
+    
+    # Line bboxes are the union of the line's word bboxes, keyed by (block_no, line_no).
+    # Whitespace-only lines have no words, so they are skipped
+    line_boxes = {}
+    for x0, y0, x1, y1, word, block_no, line_no, word_no in textpage.extractWORDS():
+        box = line_boxes.get((block_no, line_no))
+        if box is None:
+            line_boxes[block_no, line_no] = [x0, y0, x1, y1]
+        else:
+            box[0] = min(box[0], x0)
+            box[1] = min(box[1], y0)
+            box[2] = max(box[2], x1)
+            box[3] = max(box[3], y1)
+    
+    # Sort by y-coordinate (top to bottom), then x-coordinate (left to right)
+    lines = sorted(line_boxes.items(), key=lambda item: (item[1][1], item[1][0]))
+    
+    # Add text lines with spacing
+    prev_bottom = None
+    for (block_no, line_no), (x0, y0, x1, y1) in lines:
+        # Add spacing between lines that are far apart vertically
+        if prev_bottom is not None and y0 - prev_bottom > 20:  # Significant vertical gap
+            out.write("\n\n")
         
+        out.write(block_lines[block_no][line_no])
+        out.write("\n")
+        prev_bottom = y1
+    
+    return page_num, out.getvalue()
+
+
+def _usable_cpus() -> int:
+    """
+    CPUs this process may run on. Containers and taskset limit this below os.cpu_count().
+    """
+    if hasattr(os, "sched_getaffinity"):  # Not available on macOS or Windows
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _write_pages(results, out) -> None:
+    """
+    Write (page_num, text) results to out in the order they arrive.
+    """
+    for page_num, page_text in results:
         # Add page separator
         if page_num > 0:
-            text_parts.append(f"\n--- Page {page_num + 1} ---\n")
-        
-        # Add text blocks with spacing
-        for i, block in enumerate(text_blocks):
-            text_parts.append(block["text"])
-            
-            # Add spacing between blocks that are far apart vertically
-            if i < len(text_blocks) - 1:
-                current_bottom = block["bbox"][3]
-                next_top = text_blocks[i + 1]["bbox"][1]
-                if next_top - current_bottom > 20:  # Significant vertical gap
-                    text_parts.append("\n")
+            out.write(f"\n--- Page {page_num + 1} ---\n\n")
+        out.write(page_text)
+
+
+def extract_text_with_reading_order(pdf_path: str, out=None) -> None:
+    """
+    Extract text from PDF with approximate reading order and table preservation.
+    Each page is written to out (stdout by default) as soon as it is ready, so
+    memory stays flat regardless of document size.
+    Pages are extracted in parallel worker processes for larger documents.
+    """
+    if out is None:
+        out = sys.stdout
+    
+    page_count = len(_open_document(pdf_path, os.path.getmtime(pdf_path)))
     
-    doc.close()
-    return "\n".join(text_parts)
+    extract_page = partial(_extract_page, pdf_path)
+    if page_count < PARALLEL_MIN_PAGES:
+        _write_pages(map(extract_page, range(page_count)), out)
+    else:
+        # ex.map yields results in page order while later pages are still running
+        # Forked workers must not share the parent's open documents (and their file offsets)
+        with ProcessPoolExecutor(max_workers=min(_usable_cpus(), page_count),
+                                 initializer=_open_document.cache_clear) as ex:
+            _write_pages(ex.map(extract_page, range(page_count)), out)
 
 
 def main():
@@ -67,8 +126,7 @@ def main():
     args = parser.parse_args()
     
     try:
-        text = extract_text_with_reading_order(args.pdf)
-        print(text)
+        extract_text_with_reading_order(args.pdf)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -6,152 +6,173 @@ Ex: "40104.1" -> "40104"
 Need to add logic for correct number format
 """
 
-import sys
-import re
+import argparse
 import json
+import mmap
+import os
+import re
+import stat
+import string
+
+
+# The patterns run on UTF-8 bytes, where \s, \d and \b only know ASCII. _WS matches every
+# character str-mode \s does (NBSP, thin spaces, ...), which PDF text keeps. \d and \b stay
+# ASCII: values are ASCII, so "é12345" now yields 12345 and Arabic-Indic digits are skipped.
+_WS = (rb'(?:[\s\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]'
+       rb'|\xe2\x81\x9f|\xe3\x80\x80)')
+
+_ORDER_KEYWORD = re.compile(rb'\border' + _WS + rb'*(?:number|#|num)', re.IGNORECASE)
+
+# Pattern 1: After "order number:" or "order #:"
+_LABELED = re.compile(rb'(?P<keyword>order' + _WS + rb'*(?:number|#|num))' + _WS + rb'*:?' + _WS +
+                      rb'*(?P<value>[A-Z0-9][A-Z0-9\.\-]{2,})', re.IGNORECASE)
+
+# Pattern 2: Common order number formats
+# Format: O-XXXXX-RX
+_TUBI = re.compile(rb'\b([A-Z]-[A-Z0-9]{4,}-[A-Z0-9]{1,2})\b', re.IGNORECASE)
+# Format: XXXXX.X or XXXXX
+# \b already stops a match from starting inside a digit run
+_NUMERIC = re.compile(rb'\b(\d{4,}(?:\.\d+)?)\b')
+# Format: Alphanumeric (CP32K5B style)
+_ALNUM = re.compile(rb'\b([A-Z]{2,}[0-9][A-Z0-9]{2,})\b', re.IGNORECASE)
+
+# "Order Number:" usually sits in the header, so this much of the text is checked first
+_FAST_PATH_BYTES = 2048
+
+# Words that show up next to order number labels but are never the number itself
+_STOPWORDS = frozenset({'and', 'the', 'for', 'with', 'from', 'this', 'that', 'order', 'number', 'sent', 'date'})
+
+# Score bonus for the pattern a candidate was found with
+_PATTERN_BONUS = {
+    'labeled': 1000,  # Found after "Order Number:" label
+    'tubi_format': 800,  # O-XXXXX-RX format
+    'alphanumeric': 600,  # CP32K5B format
+    'numeric': 400,  # Plain numbers
+}
+
+# Translation table that deletes digits, for counting them without a per-character loop
+_DROP_DIGITS = str.maketrans('', '', string.digits)
+
+
+def _keyword_contexts(text):
+    """
+    Yield (start, end) offsets for each line that mentions "order number" or "order #",
+    extended over the 2 lines after it (without the final newline).
+    """
+    line_end = -1
+    for keyword in _ORDER_KEYWORD.finditer(text):
+        # One context per line, and the keyword itself must not span lines
+        if keyword.start() <= line_end or b'\n' in keyword.group():
+            continue
+        
+        start = text.rfind(b'\n', 0, keyword.start()) + 1
+        line_end = text.find(b'\n', keyword.start())
+        if line_end == -1:
+            line_end = len(text)
+        
+        end = line_end
+        for _ in range(2):
+            if end == len(text):
+                break
+            newline = text.find(b'\n', end + 1)
+            end = len(text) if newline == -1 else newline
+        yield start, end
+
+
+def _context_candidates(text, start: int, end: int):
+    """
+    Yield (value, pattern, span) for every candidate in one keyword context, in the
+    order the patterns are tried: labeled, tubi_format, numeric, alphanumeric.
+    """
+    # Only the first labeled value per context
+    match = _LABELED.search(text, start, end)
+    if match:
+        yield match.group('value'), 'labeled', match.span('value')
+    
+    for match in _TUBI.finditer(text, start, end):
+        yield match.group(1), 'tubi_format', match.span(1)
+    
+    for match in _NUMERIC.finditer(text, start, end):
+        value = match.group(1)
+        # Filter out dates (like 2025, 20251231) and years
+        if not (value.startswith(b'20') and len(value) >= 4):
+            yield value, 'numeric', match.span(1)
+    
+    for match in _ALNUM.finditer(text, start, end):
+        yield match.group(1), 'alphanumeric', match.span(1)
+
+
+def _is_bad(value: str) -> bool:
+    """
+    Skip obviously wrong values.
+    """
+    return (len(value) < 3 or  # Too short
+            value.isalpha() or  # All letters
+            value.lower() in _STOPWORDS)
+
+
+def _score(value: str, pattern: str) -> int:
+    """
+    Score a candidate by the pattern that found it and the shape of the value.
+    """
+    # Pattern bonuses
+    score = _PATTERN_BONUS[pattern]
+    
+    # Length bonus (longer is generally better, but cap it)
+    score += min(len(value) * 10, 100)
+    
+    # Digit bonus
+    digit_count = len(value) - len(value.translate(_DROP_DIGITS))
+    score += digit_count * 20
+    
+    # Hyphen/dash bonus (common in order numbers)
+    hyphen_count = value.count('-')
+    score += hyphen_count * 100
+    
+    # Penalty for too many letters (but some letters are ok)
+    # Candidates only hold letters, digits, '.' and '-' (see the patterns above), so the rest are letters
+    letter_count = len(value) - digit_count - hyphen_count - value.count('.')
+    if letter_count > digit_count * 2:  # More than 2x letters vs digits
+        score -= 100
+    
+    return score
+
+
+def _labeled_result(value: str, pattern: str) -> dict:
+    """
+    Result for a labeled order number returned without scoring any other candidate.
+    """
+    score = _score(value, 'labeled')
+    return {
+        "ok": True,
+        "order_number": value,
+        "provenance": f"FOUND_{value}_pattern_{pattern}_score_{score}",
+        "all_candidates": [value],
+        "scores": {value: score}
+    }
 
 
-def extract_order_number(text_file_path: str) -> dict:
+def extract_order_number(text_file_path: str, exhaustive: bool = True) -> dict:
     """
     Robust order number extractor - looks for all "order number" patterns and picks the best one.
     
+    With exhaustive=False the first valid labeled match ("Order Number: X") is returned as
+    soon as it is seen. That is faster but can differ from the full scoring: a Tubi-format
+    value with hyphens can outscore a short labeled one.
+    
     Returns:
         dict: { ok: bool, order_number: str, provenance: str, all_candidates: list, scores: dict }
     """
     try:
-        with open(text_file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        
-        candidates = []
-        
-        # Strategy: Find lines/contexts that mention "order number" or "order #"
-        # Then extract values that appear after these keywords
-        
-        # Split into lines for context-aware extraction
-        lines = text.split('\n')
-        
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            
-            # Check if this line mentions "order number" or "order #"
-            if re.search(r'\border\s*(?:number|#|num)', line_lower):
-                # Extract all potential order numbers from this line and next 2 lines
-                context_lines = [line]
-                if i + 1 < len(lines):
-                    context_lines.append(lines[i + 1])
-                if i + 2 < len(lines):
-                    context_lines.append(lines[i + 2])
-                
-                context = ' '.join(context_lines)
-                
-                # Pattern 1: After "order number:" or "order #:"
-                match = re.search(r'order\s*(?:number|#|num)\s*:?\s*([A-Z0-9][A-Z0-9\.\-]{2,})', context, re.IGNORECASE)
-                if match:
-                    candidates.append({
-                        'value': match.group(1),
-                        'context': context[:100],
-                        'pattern': 'labeled'
-                    })
-                
-                # Pattern 2: Look for common order number formats in context
-                # Format: O-XXXXX-RX
-                for match in re.finditer(r'\b([A-Z]-[A-Z0-9]{4,}-[A-Z0-9]{1,2})\b', context, re.IGNORECASE):
-                    candidates.append({
-                        'value': match.group(1),
-                        'context': context[:100],
-                        'pattern': 'tubi_format'
-                    })
-                
-                # Format: XXXXX.X or XXXXX
-                for match in re.finditer(r'\b(\d{4,}(?:\.\d+)?)\b', context):
-                    value = match.group(1)
-                    # Filter out dates (like 2025, 20251231) and years
-                    if not (value.startswith('20') and len(value) >= 4):
-                        candidates.append({
-                            'value': value,
-                            'context': context[:100],
-                            'pattern': 'numeric'
-                        })
-                
-                # Format: Alphanumeric (CP32K5B style)
-                for match in re.finditer(r'\b([A-Z]{2,}[0-9][A-Z0-9]{2,})\b', context, re.IGNORECASE):
-                    candidates.append({
-                        'value': match.group(1),
-                        'context': context[:100],
-                        'pattern': 'alphanumeric'
-                    })
-        
-        # Remove duplicates
-        unique_candidates = {}
-        for cand in candidates:
-            value = cand['value'].strip()
-            if value and value not in unique_candidates:
-                # Skip obviously wrong values
-                if (value.lower() in ['and', 'the', 'for', 'with', 'from', 'order', 'number', 'sent', 'date'] or
-                    value.isalpha() or  # All letters
-                    len(value) < 3):  # Too short
-                    continue
-                unique_candidates[value] = cand
-        
-        if not unique_candidates:
-            return {
-                "ok": False,
-                "order_number": "UNKNOWN",
-                "provenance": "NO_ORDER_NUMBER_FOUND",
-                "all_candidates": [],
-                "scores": {}
-            }
-        
-        # Score each candidate
-        scored_candidates = []
-        for value, cand in unique_candidates.items():
-            score = 0
-            
-            # Pattern bonuses
-            if cand['pattern'] == 'labeled':  # Found after "Order Number:" label
-                score += 1000
-            elif cand['pattern'] == 'tubi_format':  # O-XXXXX-RX format
-                score += 800
-            elif cand['pattern'] == 'alphanumeric':  # CP32K5B format
-                score += 600
-            elif cand['pattern'] == 'numeric':  # Plain numbers
-                score += 400
-            
-            # Length bonus (longer is generally better, but cap it)
-            score += min(len(value) * 10, 100)
-            
-            # Digit bonus
-            digit_count = sum(c.isdigit() for c in value)
-            score += digit_count * 20
-            
-            # Hyphen/dash bonus (common in order numbers)
-            score += value.count('-') * 100
-            
-            # Penalty for too many letters (but some letters are ok)
-            letter_count = sum(c.isalpha() for c in value)
-            if letter_count > digit_count * 2:  # More than 2x letters vs digits
-                score -= 100
-            
-            scored_candidates.append({
-                'value': value,
-                'score': score,
-                'pattern': cand['pattern'],
-                'context': cand['context']
-            })
-        
-        # Sort by score
-        scored_candidates.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Pick the best one
-        best = scored_candidates[0]
-        
-        return {
-            "ok": True,
-            "order_number": best['value'],
-            "provenance": f"FOUND_{best['value']}_pattern_{best['pattern']}_score_{best['score']}",
-            "all_candidates": [c['value'] for c in scored_candidates],
-            "scores": {c['value']: c['score'] for c in scored_candidates}
-        }
+        # Map the file and match bytes patterns against it directly rather than
+        # decoding the whole dump; only matched values get decoded
+        with open(text_file_path, 'rb') as f:
+            info = os.fstat(f.fileno())
+            # Pipes and FIFOs can't be mapped; mmap also rejects empty files
+            if not stat.S_ISREG(info.st_mode) or info.st_size == 0:
+                return _find_order_number(f.read(), exhaustive)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                return _find_order_number(text, exhaustive)
         
     except Exception as e:
         return {
@@ -163,13 +184,94 @@ def extract_order_number(text_file_path: str) -> dict:
         }
 
 
+def _find_order_number(text, exhaustive: bool) -> dict:
+    """
+    Collect, filter and score candidates from the raw bytes of a text dump.
+    """
+    # Fast path: a labeled value near the top of the text skips the full scan
+    if not exhaustive:
+        match = _LABELED.search(text, 0, _FAST_PATH_BYTES)
+        # Only take a match the context scan below would also return: it must start a
+        # keyword line of its own (word boundary, keyword not split across lines) and end
+        # within the 2 lines after it. A match running up to the cutoff may have had its
+        # value truncated. Anything else falls through to the scan.
+        if (match and match.end() < _FAST_PATH_BYTES
+                and _ORDER_KEYWORD.match(text, match.start())
+                and b'\n' not in match.group('keyword')
+                and text.count(b'\n', match.start(), match.end()) <= 2):
+            value = match.group('value').decode('utf-8')
+            if not _is_bad(value):
+                return _labeled_result(value, 'labeled_fast_path')
+    
+    # Deduplicated candidates keyed by value, in order of first appearance
+    unique_candidates = {}
+    
+    # Strategy: Find lines/contexts that mention "order number" or "order #"
+    # Then extract values from those lines and the 2 lines after, scanning only
+    # the context offsets rather than the whole text
+    for start, end in _keyword_contexts(text):
+        for value, pattern, span in _context_candidates(text, start, end):
+            value = value.decode('utf-8')
+            if _is_bad(value):
+                continue
+            
+            # Opt-in shortcut: take the first good labeled value without scoring the rest
+            if pattern == 'labeled' and not exhaustive:
+                return _labeled_result(value, pattern)
+            
+            # Remove duplicates, keeping the first pattern a value was seen with
+            if value not in unique_candidates:
+                unique_candidates[value] = {
+                    'value': value,
+                    # Offsets into the text rather than a copied snippet
+                    'span': span,
+                    'pattern': pattern
+                }
+    
+    if not unique_candidates:
+        return {
+            "ok": False,
+            "order_number": "UNKNOWN",
+            "provenance": "NO_ORDER_NUMBER_FOUND",
+            "all_candidates": [],
+            "scores": {}
+        }
+    
+    # Score each candidate
+    scored_candidates = []
+    for value, cand in unique_candidates.items():
+        score = _score(value, cand['pattern'])
+        
+        scored_candidates.append({
+            'value': value,
+            'score': score,
+            'pattern': cand['pattern'],
+            'span': cand['span']
+        })
+    
+    # Sort by score
+    scored_candidates.sort(key=lambda x: x['score'], reverse=True)
+    
+    # Pick the best one
+    best = scored_candidates[0]
+    
+    return {
+        "ok": True,
+        "order_number": best['value'],
+        "provenance": f"FOUND_{best['value']}_pattern_{best['pattern']}_score_{best['score']}",
+        "all_candidates": [c['value'] for c in scored_candidates],
+        "scores": {c['value']: c['score'] for c in scored_candidates}
+    }
+
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python extract_order_number.py <text_file_path>", file=sys.stderr)
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Extract the order number from a text dump")
+    parser.add_argument("text_file_path", help="Path to text file")
+    parser.add_argument("--first-labeled", action="store_true",
+                        help="Stop at the first labeled match instead of scoring every candidate")
+    args = parser.parse_args()
     
-    text_file_path = sys.argv[1]
-    result = extract_order_number(text_file_path)
+    result = extract_order_number(args.text_file_path, exhaustive=not args.first_labeled)
     
     # Output as JSON for the Node.js script to parse
     print(json.dumps(result, indent=2))